@@ -14,6 +14,22 @@ from sqlalchemy.ext.automap import automap_base
 # Local Imports
 from nbapredict.configuration import Config
 
+# Engines cached per URL. Each scheduled scrape builds a fresh DBInterface; reusing the engine keeps
+# its connection pool alive across runs instead of reconnecting every time.
+_engine_cache = {}
+
+
+def _get_engine(url):
+    """Return the pooled engine for url, creating it on first use."""
+    if url not in _engine_cache:
+        if url.startswith("postgresql"):
+            # psycopg2 rewrites executemany inserts into multi-row VALUES statements with this mode.
+            # Other dialects (the default SQLite file) reject the argument, so only pass it for Postgres.
+            _engine_cache[url] = create_engine(url, pool_pre_ping=True, executemany_mode="values_plus_batch")
+        else:
+            _engine_cache[url] = create_engine(url, pool_pre_ping=True)
+    return _engine_cache[url]
+
 
 class DBInterface:
     """DBInterface contains high level information about the desired database and creation, deletion, and access functions
@@ -42,7 +58,7 @@ class DBInterface:
             self.path = Config.get_property("database")
         else:
             self.path = url
-        self.engine = create_engine(self.path, pool_pre_ping=True)
+        self.engine = _get_engine(self.path)
         self.metadata = MetaData(self.engine)
         self.Base = declarative_base()
 
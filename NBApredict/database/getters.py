@@ -5,6 +5,7 @@ summaries
 
 from datetime import timedelta
 import pandas as pd
+from sqlalchemy import func
 
 
 def get_games_on_day(schedule, session, date):
@@ -36,6 +37,23 @@ def get_first_game_time_on_day(schedule, session, date):
         return None
 
 
+def get_first_game_times(schedule, session, date):
+    """Return the first game time of every game day on or after the specified date, in chronological order
+
+    A single min(start_time) grouped by calendar day replaces querying each date individually.
+
+    Args:
+        schedule: A mapped table object containing a schedule of games
+        session: An instantiated session object
+        date: The date to return first game times from
+    """
+    rows = session.query(func.min(schedule.start_time)). \
+        filter(schedule.start_time >= date). \
+        group_by(func.date(schedule.start_time)). \
+        order_by(func.min(schedule.start_time)).all()
+    return [row[0] for row in rows]
+
+
 def get_spreads_for_date(odds_table, session, date):
     """Return the spreads from the odds_table that correspond to the games
 
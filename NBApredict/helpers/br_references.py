@@ -62,6 +62,11 @@ class Team(Enum):
     VANCOUVER_GRIZZLIES = "VANCOUVER GRIZZLIES"
 
 
+# Maps lowercased team names to the standard team name. Built once at import so normalization is a
+# dict lookup rather than a scan of the Team enum on every call
+team_name_lookup = {team.value.lower(): team.value for team in Team}
+
+
 class OutputType(Enum):
     JSON = "JSON"
     CSV = "CSV"
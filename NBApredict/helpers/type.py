@@ -4,7 +4,9 @@ Contains type checks and type conversion functions
 
 from datetime import datetime
 from enum import Enum
+import numpy as np
 import os
+import re
 
 
 def set_type(values):
@@ -35,6 +37,9 @@ def set_type(values):
 def _set_type(values, new_type):
     """Transforms a list of values into the specified new type. If the value has zero length, returns none
 
+    The cast runs as one vectorized astype over the whole column rather than a Python conversion per
+    element.
+
     Args:
         values: A list of values
         new_type: A type class to modify the list to
@@ -42,13 +47,15 @@ def _set_type(values, new_type):
     Returns:
         The values list modified to the new_type. If an element is empty, the element is set to None.
         """
-
-    new_vals = []
-    for i in values:
-        if len(i) > 0:  # Some values may have len(0); we convert them to None to put into sql db
-            new_vals.append(new_type(i))
-        else:
-            new_vals.append(None)
+    arr = np.asarray(values)
+    empty = arr == ""  # Some values may have len(0); we convert them to None to put into sql db
+    if not empty.any():
+        return arr.astype(new_type).tolist()
+
+    new_vals = [None] * len(values)
+    converted = arr[~empty].astype(new_type).tolist()
+    for position, value in zip(np.flatnonzero(~empty), converted):
+        new_vals[position] = value
     return new_vals
 
 
@@ -67,7 +74,9 @@ def get_type(values):
     if hasattr(values, "__len__") and (type(values) != type):  # Checks if the object is iterable
         val_types = []
         for i in values:
-            val_types.append(_get_type(i))
+            # Exact-type dict hit for the common cases; anything else (None, explicit type objects,
+            # subclasses) falls through to the isinstance chain in _get_type
+            val_types.append(_type_names.get(type(i)) or _get_type(i))
         return max(set(val_types), key=val_types.count)  # The max, set, and key combo returns the modal type
     elif isinstance(values, Enum):  # For enum objects, pass the value to the get_type function (right choice? IDK)
         return _get_type(values.value)
@@ -75,6 +84,12 @@ def get_type(values):
         return _get_type(values)
 
 
+# Hoists _get_type's isinstance dispatch into a single dict lookup keyed on the exact type. bool maps
+# to "integer" because _get_type's isinstance(val, int) branch catches bools first; the dict keeps that
+# behavior.
+_type_names = {int: "integer", bool: "integer", float: "float", datetime: "datetime", str: "string"}
+
+
 def _get_type(val):
     """Return the type of the value if it is a int, float, or datetime. Otherwise, return a string.
 
@@ -103,8 +118,16 @@ def _get_type(val):
         raise Exception("Val is not an int, float, datetime, string, Bool, or None")
 
 
+# Matches whole strings int() and float() accept; checking with a compiled pattern avoids raising and
+# catching a ValueError for every non-numeric string
+_int_pattern = re.compile(r"[+-]?[0-9]+$")
+_float_pattern = re.compile(r"[+-]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][+-]?[0-9]+)?$")
+
+
 def is_int(x):
     """Return true if X can be coerced to a integer. Otherwise, return false."""
+    if isinstance(x, str):
+        return _int_pattern.match(x.strip()) is not None
     try:
         int(x)  # Will raise ValueError if '.2'; will not raise error if .2
         return True
@@ -114,6 +137,8 @@ def is_int(x):
 
 def is_float(x):
     """Return true if X can be coerced to a float. Otherwise, return false."""
+    if isinstance(x, str):
+        return _float_pattern.match(x.strip()) is not None
     try:
         float(x)
         return True
@@ -1,13 +1,43 @@
 """Functions for prediction table creation and operations."""
 
+from sqlalchemy import DateTime, Float, ForeignKey, Integer, String, UniqueConstraint
 
-def format_data():
-    pass
 
+def columns(sched_tbl):
+    """Return the static column specification for a predictions table.
 
-def create_table(db, prediction_data):
-    pass
+    Declaring the schema up front replaces the old flow of generating a sample prediction at runtime
+    just to infer the column types from its values.
 
+    Args:
+        sched_tbl: A mapped schedule table object used for the game_id foreign key
 
-def insert():
-    pass
+    Returns:
+        A dictionary of column names with their SQLalchemy types and any column-level arguments
+    """
+    sched_tbl_name = sched_tbl.__table__.fullname
+    return {"start_time": [DateTime],
+            "home_team": [String],
+            "away_team": [String],
+            "prediction": [Float],
+            "line": [Float],
+            "probability": [Float],
+            "function": [String],
+            "bet_result": [String],
+            "home_team_score": [Integer],
+            "away_team_score": [Integer],
+            "game_id": [Integer, ForeignKey("{}.id".format(sched_tbl_name))]}
+
+
+def create_table(db, tbl_name, sched_tbl):
+    """Create a predictions table in the database from the static column specification.
+
+    Args:
+        db: a datatotable database object
+        tbl_name: The desired table name (with year as the last four characters)
+        sched_tbl: A mapped schedule table object
+    """
+    constraints = [UniqueConstraint("home_team", "away_team", "start_time")]
+    db.map_table(tbl_name=tbl_name, columns=columns(sched_tbl), constraints=constraints)
+    db.create_tables()
+    db.clear_mappers()
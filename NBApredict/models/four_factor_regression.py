@@ -48,6 +48,7 @@ class LinearRegression:
         adj_r_squared: adj_r_squared of the regression
         r_squared_rnd: r_squared rounded to three decimal places
         residuals: residuals of the gression
+        residual_std: standard deviation of the residuals, computed once at fit time
         p_values: p_values of the coefficients
         coefs: values of the coefficients
         output: data frame of coefficients with their values and p_values"""
@@ -66,6 +67,7 @@ class LinearRegression:
         self.adj_r_squared = self.results.rsquared_adj
         self.r_squared_rnd = np.around(self.r_squared, 3)
         self.residuals = self.results.resid
+        self.residual_std = np.std(self.residuals)
         self.p_values = self.results.pvalues
         self.coefs = self.results.params
         self.output = pd.concat([self.coefs, self.p_values], axis=1)
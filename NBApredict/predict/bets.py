@@ -9,11 +9,14 @@ ToDo:
 """
 
 from datetime import datetime
+from math import erf, sqrt
 import numpy as np
 import pandas as pd
-import scipy.stats as stats
+from scipy.special import ndtr
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import case, insert, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
 
 # Local imports
@@ -27,6 +30,43 @@ from nbapredict.management.tables import predictions
 from nbapredict.models import four_factor_regression as ff_reg
 
 
+_SQRT2 = sqrt(2.0)
+
+
+def norm_cdf(z):
+    """Return the standard normal CDF of a scalar z.
+
+    Stdlib counterpart to scipy.special.ndtr for the single-game path; math.erf skips the array
+    machinery ndtr runs even for 0-d inputs.
+    """
+    return 0.5 * (1.0 + erf(z / _SQRT2))
+
+
+_regression_cache = {}
+
+
+def get_regression(session, team_stats_tbl, sched_tbl):
+    """Return the day's regression, refitting it only when the league year or date changes.
+
+    The daily scheduler fires a job per game day, and each job refit the regression even though its
+    inputs only change when new stats are scraped. Caching by (league_year, date) refits at most once
+    per day and hands every later job the stored model.
+
+    Args:
+        session: A SQLalchemy session object
+        team_stats_tbl: A mapped team stats table object
+        sched_tbl: A mapped schedule table object
+
+    Returns:
+        A LinearRegression class from four_factor_regression.py
+    """
+    key = (Config.get_property("league_year"), datetime.date(datetime.now()))
+    if key not in _regression_cache:
+        _regression_cache.clear()  # Keep at most one regression alive
+        _regression_cache[key] = ff_reg.main(session, team_stats_tbl, sched_tbl)
+    return _regression_cache[key]
+
+
 def get_prediction(reg, pred_df):
     """Generate and return a prediction for the observations in the pred_df.
 
@@ -39,11 +79,24 @@ def get_prediction(reg, pred_df):
     return reg.results.predict(pred_df).values[0]
 
 
+def get_prediction_batch(reg, pred_df):
+    """Generate and return predictions for every observation in the pred_df.
+
+    A single .predict() call over a stacked dataframe costs one statsmodels dispatch no matter how many
+    games it holds, where per-game get_prediction() calls pay that overhead per row.
+
+    Args:
+        reg: LinearRegression class from four_factors_regression.py
+        pred_df: A dataframe of observations, one row per game, from which to generate predictions
+
+    Returns:
+        An array of predicted values ordered the same as the rows of pred_df"""
+    return reg.results.predict(pred_df).values
+
+
 def get_team_name(team):
     """Match team to a standard team name and return the br_references standard team name."""
-    for team_name in br_references.Team:
-        if team.lower() == team_name.value.lower():
-            return team_name.value
+    return br_references.team_name_lookup.get(team.lower())
 
 
 # def create_prediction_df(home_tm, away_tm, ff_df):
@@ -69,24 +122,13 @@ def get_team_name(team):
 #     return merged
 
 
-def get_team_ff(team, ff_df, home):
-    """Create and return a data frame of the four factors for the specified team.
-
-    Args:
-        team: The team to extract the four factors for
-        ff_df: A dataframe of the four factors
-        home: Boolean which dictates if an '_h or '_a' should be appended to the team's stats
+def team_row_map(ff_df):
+    """Map each lowercase team name in ff_df to its positional row index.
 
-    Returns:
-        The four factors, with a home or away suffix, for a team are returned as a data frame
+    Build the map once per ff_df so repeated lookups are dict hits instead of a lowercased string
+    comparison against every row.
     """
-    ff_list = br_references.four_factors
-    team_ff = ff_df[ff_df.team_name.str.lower() == team.lower()][ff_list]
-    if home:
-        team_ff = team_ff.rename(ff_reg.append_h, axis='columns')
-    else:
-        team_ff = team_ff.rename(ff_reg.append_a, axis='columns')
-    return team_ff
+    return {name.lower(): i for i, name in enumerate(ff_df.team_name)}
 
 
 def line_probability(prediction, line, std):
@@ -104,15 +146,46 @@ def line_probability(prediction, line, std):
         The survival function or cumulative density function for the line in relation to the prediction
     """
     # ToDo: T-Distribution?
-    dist = stats.norm(loc=prediction, scale=std)
     line_prediction = -1 * line
 
+    # Standardize the line and evaluate the standard normal CDF directly. A frozen
+    # stats.norm(loc, scale) object costs far more to build than the single evaluation we need from it.
+    z = (line_prediction - prediction) / std
+
     if prediction > line_prediction:
-        return dist.cdf(line_prediction), "cdf"
+        return norm_cdf(z), "cdf"
     elif prediction < line_prediction:
-        return dist.sf(line_prediction), "sf"
-    elif prediction == line_prediction:
-        return 0.5  # If the predictions are equal, the cdf automatically equals 0.5
+        return 1.0 - norm_cdf(z), "sf"
+    else:
+        return 0.5, "cdf"  # If the predictions are equal, the cdf automatically equals 0.5
+
+
+def line_probabilities(predictions, lines, std):
+    """Vectorized form of line_probability() over arrays of predictions and lines.
+
+    Computes every probability in a single ndtr() call rather than evaluating games one at a time in a
+    Python loop.
+
+    Args:
+        predictions: An array-like of predictions, one per game
+        lines: An array-like of betting lines ordered the same as predictions
+        std: The standard deviation of the residuals for the model used to make the predictions
+
+    Returns:
+        A tuple of two arrays ordered the same as predictions. The first holds the probability of each
+        line in relation to its prediction. The second holds "cdf" or "sf" to mark which function the
+        probability represents.
+    """
+    predictions = np.asarray(predictions, dtype=float)
+    line_predictions = -1 * np.asarray(lines, dtype=float)
+    z = (line_predictions - predictions) / std
+    cdf = ndtr(z)
+    probabilities = np.where(predictions > line_predictions, cdf, 1.0 - cdf)
+    functions = np.where(predictions > line_predictions, "cdf", "sf")
+    equal = predictions == line_predictions
+    probabilities[equal] = 0.5
+    functions[equal] = "cdf"
+    return probabilities, functions
 
 
 def prediction_result_console_output(home_tm, away_tm, line, prediction, probability):
@@ -153,18 +226,19 @@ def insert_predictions(rows, session, pred_tbl, sched_tbl):
         pred_tbl: A mapped prediction table object
         sched_tbl: A mapped scheduled table object
     """
-    row_objects = []
-    for row in rows:
-        row_obj = pred_tbl(**row)
-        row_objects.append(row_obj)
-    row_objects = update_schedule_attributes(row_objects, session, sched_tbl)
+    rows = update_schedule_attributes(rows, session, sched_tbl)
 
-    session.add_all(row_objects)
+    # Core executemany; one INSERT with all rows rather than a unit-of-work flush per ORM object
+    session.execute(insert(pred_tbl), rows)
 
 
 def insert_new_predictions(rows, session, pred_tbl, sched_tbl, odds_tbl):
     """Insert unique predictions in rows which do not already exist in the prediction table.
 
+    The table's (home_team, away_team, start_time) unique constraint arbitrates duplicates: the INSERT
+    carries ON CONFLICT DO NOTHING, so already-stored games drop out inside the database and no
+    pre-query of existing predictions is needed.
+
     Additional information from sched_tbl and odds_tbl is added to the rows as well.
 
     # ToDo: Will need significant rewrite (Also note similarities between this function and the one above)
@@ -175,20 +249,16 @@ def insert_new_predictions(rows, session, pred_tbl, sched_tbl, odds_tbl):
         sched_tbl: A mapped scheduled table object
         odds_tbl: A mapped odds_tbl object
     """
-    row_objects = []
-    existing_predictions = session.query(pred_tbl.home_team, pred_tbl.away_team, pred_tbl.start_time).all()
-    existing_predictions = [(game.home_team, game.away_team, game.start_time) for game in existing_predictions]
-    for row in rows:
-        game_identifier = (row["home_team"], row["away_team"], row["start_time"])
-        if game_identifier in existing_predictions:
-            continue
-        else:
-            row_obj = pred_tbl(**row)
-            row_objects.append(row_obj)
-    if len(row_objects) > 0:
-        row_objects = update_odds_id(row_objects, session, odds_tbl)
-        row_objects = update_schedule_attributes(row_objects, session, sched_tbl)
-        session.add_all(row_objects)
+    if len(rows) == 0:
+        return
+    rows = update_odds_id(rows, session, odds_tbl)
+    rows = update_schedule_attributes(rows, session, sched_tbl)
+    # ON CONFLICT is dialect-specific; pick the construct matching the session's engine so Postgres
+    # deployments get the same duplicate handling as the default SQLite file
+    dialect_insert = pg_insert if session.bind.dialect.name == "postgresql" else sqlite_insert
+    statement = dialect_insert(pred_tbl.__table__).on_conflict_do_nothing(
+        index_elements=["home_team", "away_team", "start_time"])
+    session.execute(statement, rows)
 
 
 def update_prediction_table(session, pred_tbl, sched_tbl, odds_tbl):
@@ -200,56 +270,54 @@ def update_prediction_table(session, pred_tbl, sched_tbl, odds_tbl):
         sched_tbl: A mapped scheduled table object
         odds_tbl: A mapped odds_tbl object
     """
-    score_update_objs = session.query(pred_tbl).filter(or_(pred_tbl.home_team_score == 0,
-                                                           pred_tbl.away_team_score == 0)).all()
-    session.add_all(score_update_objs)
+    update_scores(session, pred_tbl, sched_tbl)
+    update_bet_results(session, pred_tbl)
 
-    bet_update_objs = session.query(pred_tbl).filter(pred_tbl.bet_result.is_(None), pred_tbl.home_team_score > 0).all()
-    bet_update_objs = update_bet_results(bet_update_objs)
-    session.add_all(bet_update_objs)
 
+def update_scores(session, pred_tbl, sched_tbl):
+    """Backfill home and away scores from the schedule for predictions whose games have completed.
 
-def update_bet_results(bet_update_objects):
-    """Take bet_update_objects, determine the prediction result, and add the result to each row in bet_update_objects.
+    A single UPDATE with subqueries correlated on game_id writes every newly completed game's scores in
+    one round-trip. The old implementation queried the unscored rows and re-added the unchanged objects
+    with add_all(), which wrote nothing but still loaded and flushed every unfinished game.
 
-    # ToDo: Will need this function, but will require a lot of modification
     Args:
-        bet_update_objects: Objects from a query.all() from the prediction table. Objects should have a home and
-        away team score.
-
-    Returns:
-        bet_update_objects updated with the bet results (WIN, LOSS, or PUSH).
+        session: A SQLalchemy session object
+        pred_tbl: A mapped prediction table object
+        sched_tbl: A mapped schedule table object
     """
-    for row in bet_update_objects:
-        score_margin = row.home_team_score - row.away_team_score
-        line_inverse = row.line * -1
-        prediction = row.prediction
-        if score_margin == line_inverse:
-            row.bet_result = "PUSH"
-        elif (score_margin < line_inverse) and (prediction < line_inverse):
-            row.bet_result = "WIN"
-        elif (score_margin > line_inverse) and (prediction > line_inverse):
-            row.bet_result = "WIN"
-        else:
-            row.bet_result = "LOSS"
-    return bet_update_objects
+    home_score = select(sched_tbl.home_team_score).where(sched_tbl.id == pred_tbl.game_id).scalar_subquery()
+    away_score = select(sched_tbl.away_team_score).where(sched_tbl.id == pred_tbl.game_id).scalar_subquery()
+    completed = select(sched_tbl.id).where(sched_tbl.id == pred_tbl.game_id,
+                                           sched_tbl.home_team_score > 0).exists()
+    session.execute(update(pred_tbl).
+                    where(or_(pred_tbl.home_team_score.is_(None), pred_tbl.home_team_score == 0),
+                          completed).
+                    values(home_team_score=home_score, away_team_score=away_score))
+
 
+def update_bet_results(session, pred_tbl):
+    """Determine the result (WIN, LOSS, or PUSH) of each unresolved bet and store it in the prediction table.
 
-def get_sample_prediction(session, regression):
-    """Generate and return a sample prediction formatted specifically for table creation.
+    The result branching runs as a SQL CASE expression inside a single UPDATE, so the database resolves
+    every completed game in one round-trip rather than the session flushing mutated objects row by row.
 
     Args:
         session: A SQLalchemy session object
-        regression: A regression object from four_factor_regression.py
-
-    Returns:
-        A DataOperator object initialized with a prediction from regression
+        pred_tbl: A mapped prediction table object
     """
-    one_row_dataframe = regression.predictors.loc[[0]]
-
-    sample_prediction = predict_game(session, regression, one_row_dataframe)
-    data = DataOperator(sample_prediction)
-    return data
+    score_margin = pred_tbl.home_team_score - pred_tbl.away_team_score
+    line_inverse = pred_tbl.line * -1
+    bet_result = case((score_margin == line_inverse, "PUSH"),
+                      ((score_margin < line_inverse) & (pred_tbl.prediction < line_inverse), "WIN"),
+                      ((score_margin > line_inverse) & (pred_tbl.prediction > line_inverse), "WIN"),
+                      else_="LOSS")
+    # A NULL line turns every WHEN comparison into SQL NULL and the row would fall through to the
+    # LOSS else_; games scraped without a spread stay unresolved instead
+    session.execute(update(pred_tbl).
+                    where(pred_tbl.bet_result.is_(None), pred_tbl.line.isnot(None),
+                          pred_tbl.home_team_score > 0).
+                    values(bet_result=bet_result))
 
 
 def predict_game(session, regression, x_df, console_out=False):
@@ -275,30 +343,99 @@ def predict_game(session, regression, x_df, console_out=False):
     return {"prediction": prediction}
 
 
-def predict_games_in_odds(session, regression, odds_tbl):
+def assemble_prediction_rows(matchups, start_times, lines, predictions, probabilities, functions):
+    """Zip the per-game arrays from the batched prediction path into table-compatible row dicts."""
+    rows = []
+    for i, (home_tm, away_tm) in enumerate(matchups):
+        rows.append({"start_time": start_times[i], "home_team": home_tm, "away_team": away_tm,
+                     "prediction": predictions[i], "line": lines[i], "probability": probabilities[i],
+                     "function": functions[i]})
+    return rows
+
+
+def predict_games_in_odds(session, regression, odds_tbl, ff_df):
     """Generate and return predictions for all games with odds in the odds_tbl
 
+    The odds are read as a single columnar dataframe and run through the batched
+    get_prediction_batch()/line_probabilities() path instead of one ORM object and scipy call per game.
+
     ToDo: Take tables as inputs vs. DB
     Args:
         session: A SQLalchemy session object
         regression: A linear regression object generated from four_factor_regression
         odds_tbl: Mapped sqlalchemy odds table
+        ff_df: A dataframe of the four factors for all teams from get_team_ff_df()
+    """
+    odds_df = conversion.convert_sql_statement_to_table(session, session.query(odds_tbl).statement)
+    if len(odds_df) == 0:
+        return []
+    matchups = [(get_team_name(home_tm), get_team_name(away_tm))
+                for home_tm, away_tm in zip(odds_df["home_team"], odds_df["away_team"])]
+    lines = odds_df["spread"].tolist()
+
+    predictions = get_prediction_batch(regression, build_prediction_df(matchups, ff_df, regression))
+    probabilities, functions = line_probabilities(predictions, lines, regression.residual_std)
+    return assemble_prediction_rows(matchups, odds_df["start_time"].tolist(), lines, predictions,
+                                    probabilities, functions)
+
 
+def get_team_ff_df(session, teams_tbl, team_stats_tbl):
+    """Return a dataframe of the latest four factors for each team with team names attached.
+
+    Args:
+        session: A SQLalchemy session object
+        teams_tbl: A mapped teams table object
+        team_stats_tbl: A mapped team stats table object
+
+    Returns:
+        A dataframe with a team_name column and the most recent four factors for each team
     """
-    all_odds = session.query(odds_tbl).all()
-    predictions = []
-    for odds in all_odds:
-        home_team = odds.home_team
-        away_team = odds.away_team
-        start_time = odds.start_time
-        line = odds.spread
-        predictions.append(predict_game(session, regression, home_team, away_team, start_time, line))
-    return predictions
+    stats_df = conversion.convert_sql_statement_to_table(session, session.query(team_stats_tbl).statement)
+    stats_df = stats_df.sort_values("id").groupby("team_id", as_index=False).last()  # Latest stats per team
+    teams_df = conversion.convert_sql_statement_to_table(session, session.query(teams_tbl).statement)
+    teams_df = teams_df.rename(columns={"id": "team_id"})
+    return stats_df.merge(teams_df, on="team_id")
+
+
+def build_prediction_df(matchups, ff_df, regression):
+    """Create and return a dataframe with one four-factor row per matchup.
+
+    The columns are laid out in the regression's predictor order (const, home block, away block).
+    statsmodels aligns non-formula exog positionally rather than by name, so any other ordering would
+    silently pair values with the wrong coefficients.
+
+    Args:
+        matchups: A list of (home_team, away_team) tuples
+        ff_df: Dataframe of the four factors for all teams
+        regression: A LinearRegression class whose predictors define the column order
+
+    Returns:
+        A dataframe of home ('_h') and away ('_a') four factors with one row per matchup, suitable for a
+        single batched get_prediction_batch() call
+    """
+    ff_list = br_references.four_factors
+    row_map = team_row_map(ff_df)
+    home_rows = [row_map[home_tm.lower()] for home_tm, away_tm in matchups]
+    away_rows = [row_map[away_tm.lower()] for home_tm, away_tm in matchups]
+    ff_matrix = ff_df[ff_list].to_numpy(dtype=float)
+
+    # Fill a preallocated matrix with two fancy-indexed takes rather than concatenating a single-row
+    # dataframe per game
+    n_factors = len(ff_list)
+    data = np.empty((len(matchups), 2 * n_factors + 1))
+    data[:, 0] = 1.0  # sm.add_constant prepends const to the training predictors
+    data[:, 1:n_factors + 1] = ff_matrix[home_rows]
+    data[:, n_factors + 1:] = ff_matrix[away_rows]
+
+    return pd.DataFrame(data, columns=list(regression.predictors.columns))
 
 
 def predict_games_on_day(database, session, games, console_out=False):
     """Take a SQLalchemy query object of games, and return a prediction for each game.
 
+    Predictions for every game come from one batched get_prediction_batch() call and their line
+    probabilities from one vectorized line_probabilities() call.
+
     ToDO: On day versus on date?
     Args:
         database: an instantiated DBInterface class from database.dbinterface.py
@@ -306,23 +443,30 @@ def predict_games_on_day(database, session, games, console_out=False):
         games: a SQLalchemy query object of games containing start_time, home_tm, away_tm, and the spread
         console_out: A bool. True to print prediction outputs
     """
-    results = []
-    regression = ff_reg.main(database=database, session=session, year=year)
-    try:
-        for game in games:
-            prediction = predict_game(database=database, session=session, regression=regression, home_tm=game.home_team,
-                                      away_tm=game.away_team, start_time=game.start_time, line=game.spread,
-                                      console_out=console_out)
-            results.append(prediction)
-    except AttributeError:
-        # If games doesn't contain spreads, catch the attribute error and pass a 0 line.
+    league_year = Config.get_property("league_year")
+    team_stats_tbl = database.get_table_mappings("team_stats_{}".format(league_year))
+    sched_tbl = database.get_table_mappings("schedule_{}".format(league_year))
+    teams_tbl = database.get_table_mappings("teams_{}".format(league_year))
+    regression = get_regression(session, team_stats_tbl, sched_tbl)
+    ff_df = get_team_ff_df(session, teams_tbl, team_stats_tbl)
+
+    matchups = []
+    start_times = []
+    lines = []
+    for game in games:
+        matchups.append((get_team_name(game.home_team), get_team_name(game.away_team)))
+        start_times.append(game.start_time)
+        # If games doesn't contain spreads (e.g. schedule rows), pass a 0 line.
         # If games is missing other data, function will break.
-        for game in games:
-            prediction = predict_game(database=database, session=session, regression=regression, home_tm=game.home_team,
-                                      away_tm=game.away_team, start_time=game.start_time, line=0,
-                                      console_out=console_out)
-            results.append(prediction)
-    return results
+        lines.append(getattr(game, "spread", 0))
+
+    predictions = get_prediction_batch(regression, build_prediction_df(matchups, ff_df, regression))
+    probabilities, functions = line_probabilities(predictions, lines, regression.residual_std)
+
+    if console_out:
+        for i, (home_tm, away_tm) in enumerate(matchups):
+            prediction_result_console_output(home_tm, away_tm, lines[i], predictions[i], probabilities[i])
+    return assemble_prediction_rows(matchups, start_times, lines, predictions, probabilities, functions)
 
 
 def predict_games_on_date(database, session, league_year, date, console_out):
@@ -372,34 +516,29 @@ def predict_all(db):
     league_year = Config.get_property("league_year")
     sched_tbl = db.table_mappings["schedule_{}".format(league_year)]
     team_stats_tbl = db.table_mappings['team_stats_{}'.format(league_year)]
+    teams_tbl = db.table_mappings['teams_{}'.format(league_year)]
     odds_tbl = db.table_mappings['odds_{}'.format(league_year)]
 
-    regression = ff_reg.main(session, team_stats_tbl, sched_tbl)
+    regression = get_regression(session, team_stats_tbl, sched_tbl)
+    ff_df = get_team_ff_df(session, teams_tbl, team_stats_tbl)
+    results = predict_games_in_odds(session, regression, odds_tbl, ff_df)
 
     pred_tbl_name = "predictions_{}".format(league_year)
 
+    # The predictions schema is declared statically, so table creation no longer needs a sample
+    # prediction to infer column types from
     if not db.table_exists(pred_tbl_name):
-        sample = get_sample_prediction(session, regression, sched_tbl)
-        pred_data = predictions.format_data()
-        predictions.create_table()
-        pred_tbl = db.table_mappings[pred_tbl_name]
-        session.add_all([pred_tbl(**row) for row in pred_data.rows])
-        session.commit()
-    else:
-        # Data operator
-        pred_tbl = db.table_mappings[pred_tbl_name]
-        schedule_tbl = db.table_mappings[pred_tbl_name]
-        update_rows = predictions.insert(session, )
-        results = predict_games_in_odds(session, regression, odds_tbl)
-        session.add_all(update_rows)
-        session.commit()
+        predictions.create_table(db, pred_tbl_name, sched_tbl)
+    pred_tbl = db.table_mappings[pred_tbl_name]
 
     insert_new_predictions(results, session, pred_tbl, sched_tbl, odds_tbl)
 
-    session.commit()  # Commit here b/c update_prediction_tbl() needs the inserted values
+    session.flush()  # Flush so update_prediction_table() sees the inserted values within the transaction
 
     update_prediction_table(session, pred_tbl, sched_tbl, odds_tbl)
 
+    session.commit()  # A single commit; every prediction write lands in one transaction
+
 
 if __name__ == "__main__":
     db = Database('test', "../management")
@@ -154,6 +154,4 @@ def team_ff(team, ff_df, home):
 
 def team_name(team):
     """Match team to a standard team name (not cap-sensitive) and return the br_references standard team name."""
-    for team_name in br_references.Team:
-        if team.lower() == team_name.value.lower():
-            return team_name.value
+    return br_references.team_name_lookup.get(team.lower())
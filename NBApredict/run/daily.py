@@ -53,24 +53,11 @@ if __name__ == "__main__":
     session = Session(bind=database.engine)
     sched_tbl = database.get_table_mappings("sched_{}".format(year))
 
-    # Get today and the last day of the season so jobs can be scheduled from today through end of season
+    # One grouped query returns the first game time of every remaining game day in chronological
+    # order, replacing a round-trip per calendar day through the end of the season
     start_date = datetime.date(datetime.now())
-    end_date = session.query(sched_tbl.start_time).order_by(sched_tbl.start_time.desc()).first()[0]
-    end_date = datetime.date(end_date)
-
-    # Get every date between now and the last day of the season
-    date = start_date
-    game_dates = [date]
-    while date <= end_date:
-        date = date + timedelta(days=1)
-        game_dates.append(date)
-
-    # Get start times for every day in date if there are games on that day
-    start_times = []
-    for date in game_dates:
-        first_game_time = getters.get_first_game_time_on_day(sched_tbl, session, date)
-        if first_game_time:
-            start_times.append(first_game_time - timedelta(hours=1))
+    first_game_times = getters.get_first_game_times(sched_tbl, session, start_date)
+    start_times = [game_time - timedelta(hours=1) for game_time in first_game_times]
 
     # Transform start times into chron arguments for triggers
     cron_args = [datetime_to_dict(s_time) for s_time in start_times]
@@ -90,12 +77,9 @@ if __name__ == "__main__":
     logging.getLogger('apscheduler').setLevel(logging.DEBUG)
 
     try:
-        sleep_time = 0
+        # A single long sleep per wakeup; the 1-second polling loop burned 600 wakeups between checks
         while True:
-            time.sleep(1)
-            sleep_time += 1
-            if sleep_time >= 600:
-                scheduler.wakeup()
-                sleep_time = 0
+            time.sleep(600)
+            scheduler.wakeup()
     except (KeyboardInterrupt, SystemExit):
         scheduler.shutdown()
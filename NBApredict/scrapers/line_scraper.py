@@ -2,25 +2,59 @@
 line_scraper scrapes NBA betting odds from Bovada and stores them in the database.
 """
 
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import re
 import requests
-from sqlalchemy import UniqueConstraint, ForeignKey, Integer
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session, relationship
+
+try:  # orjson parses the Bovada feed several times faster than the stdlib; fall back when not installed
+    import orjson as _json
+except ImportError:
+    import json as _json
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
 
 # Local Imports
 from nbapredict.configuration import Config
-from nbapredict.database.manipulator import DataOperator
-from nbapredict.database import getters
-from nbapredict.database.reconcile import reconcile
+
+
+# A module-level session keeps the TCP/TLS connection to Bovada pooled across requests rather than
+# re-handshaking on every call
+_session = requests.Session()
+
+# Compiled once; odds_for_today pulls the start time digits out of every game link with it
+_digits_pattern = re.compile('[0-9]')
+
+# Maps the bet parsers' empty-string sentinel to None with one dict.get; other values pass through
+_empty_to_none = {"": None}
+
+# Resolved once at import; Config.get_property walks the nested settings dict on every call, which is
+# wasted work for values that never change within a process
+_regular_url = Config.get_property("regularURL")
+_playoff_url = Config.get_property("playoffURL")
 
 
 def bovada_json_request(url):
-    response = requests.get(url, allow_redirects=False).json()
+    """Fetch the Bovada feed at url and return its events list, or None when the feed is empty.
+
+    Only the events are kept; the rest of the parsed document (league metadata, display groups at the
+    top level, etc.) is released as soon as this function returns instead of being carried through the
+    parse loop.
+    """
+    # Decode from the raw bytes; response.text runs charset autodetection over the whole body when the
+    # server omits a charset, and the feed is always UTF-8 JSON
+    response = _json.loads(_session.get(url, allow_redirects=False).content)
     if not len(response):
         return None
-    return response
+    return response[0]["events"]
+
+
+def regular_season(date):
+    """Return True when date falls in months that are unambiguously NBA regular season.
+
+    October through March is always regular season; the playoffs start in mid-April and run into June,
+    so April through September is left ambiguous (off-season included) and both feeds are checked."""
+    return date.month >= 10 or date.month <= 3
 
 
 def odds_for_today():
@@ -34,17 +68,18 @@ def odds_for_today():
     """
     scrape_time = datetime.now()
 
-    # Check for response from Bovada
-    url = Config.get_property("regularURL")
-    response = bovada_json_request(url)
-    if not response:
-        url = Config.get_property("playoffURL")
-        response = bovada_json_request(url)
-        if not response:
-            return None
-
-    # Move down tree towards games
-    events = response[0]["events"]
+    # Check for a response from Bovada. During the regular season months the playoff feed is known to
+    # be empty, so only the regular URL is fetched; otherwise both feeds are requested concurrently and
+    # the regular season response wins when both return data
+    if regular_season(scrape_time):
+        events = bovada_json_request(_regular_url)
+    else:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            regular_future = executor.submit(bovada_json_request, _regular_url)
+            playoff_future = executor.submit(bovada_json_request, _playoff_url)
+            events = regular_future.result() or playoff_future.result()
+    if not events:
+        return None
 
     # Strip games from the 'event's object (which holds a bunch of random information)
     bovada_games = [e for e in events if e['description'].count('@') > 0 and e['type'] == 'GAMEEVENT']
@@ -55,54 +90,70 @@ def odds_for_today():
     lines = {"home_team": [], "away_team": [], 'start_time': [], "spread": [], "home_spread_price": [],
              "away_spread_price": [], "home_moneyline": [], "away_moneyline": [], "scrape_time": []}
 
+    # Bind each column's append once so the per-game loop skips the dict and attribute lookups
+    add_home_team = lines["home_team"].append
+    add_away_team = lines["away_team"].append
+    add_start_time = lines["start_time"].append
+    add_spread = lines["spread"].append
+    add_home_spread_price = lines["home_spread_price"].append
+    add_away_spread_price = lines["away_spread_price"].append
+    add_home_moneyline = lines["home_moneyline"].append
+    add_away_moneyline = lines["away_moneyline"].append
+    add_scrape_time = lines["scrape_time"].append
+
     # Iterate through each game returned by bovada and store its information
     for game in bovada_games:
         link = game['link'].split('-')
         link = link[len(link)-1]
-        str_time = re.findall('[0-9]', link)
+        str_time = _digits_pattern.findall(link)
         start_time = ''.join(str_time)
         start_time = datetime.strptime(start_time, "%Y%m%d%H%M")
-        if datetime.now() > start_time:
+        if scrape_time > start_time:  # Compare against the time captured once at scrape start
             # An ongoing game will not have the correct betting data. We don't want to store this information
             print("This game ({}) is either ongoing or completed. Not scraping".format(game['description']))
             continue
 
         home_team, away_team = parse_teams(game["competitors"])
 
-        # Get only the full match betting information from the game object
-        betting_info = game["displayGroups"][0]["markets"]
-        full_match_bets = [bet for bet in betting_info if bet["period"]["description"] == "Match"]
-
-        # Extract the betting data associated with the game
+        # Extract the betting data associated with the game. Only the full match Moneyline and Point
+        # Spread markets matter, so skip other markets inline and stop walking once both are parsed
         money_lines = False
-        for bet in full_match_bets:
+        spread_bets = False
+        for bet in game["displayGroups"][0]["markets"]:
+            if bet["period"]["description"] != "Match":
+                continue
             if bet["description"] == "Moneyline":
                 home_moneyline, away_moneyline = parse_moneyline(bet)
-                if home_moneyline == "":
-                    home_moneyline = None
-                if away_moneyline == "":
-                    away_moneyline = None
+                home_moneyline = _empty_to_none.get(home_moneyline, home_moneyline)
+                away_moneyline = _empty_to_none.get(away_moneyline, away_moneyline)
                 money_lines = True
             elif bet["description"] == "Point Spread":
                 spread, home_spread_price, away_spread_price = parse_spread(bet)
-                if spread == "":
-                    spread = None
-                if home_spread_price == "":
-                    home_spread_price = None
-                if away_spread_price == "":
-                    away_spread_price = None
+                spread = _empty_to_none.get(spread, spread)
+                home_spread_price = _empty_to_none.get(home_spread_price, home_spread_price)
+                away_spread_price = _empty_to_none.get(away_spread_price, away_spread_price)
+                spread_bets = True
+            if money_lines and spread_bets:
+                break
         if not money_lines:
             home_moneyline = None
             away_moneyline = None
-
-        game_lines = [home_team, away_team, start_time, spread, home_spread_price, away_spread_price, home_moneyline,
-                      away_moneyline, scrape_time]
-
-        # This section depends on python 3.7+ to preserve the order of dict keys in lines
-        i = 0
-        for key in lines:
-            lines[key].append(game_lines[i])
-            i += 1
+        if not spread_bets:
+            spread = None
+            home_spread_price = None
+            away_spread_price = None
+
+        # Append straight into the column lists; the old path built a positional game_lines list and
+        # re-walked the dict keys to transpose it into columns for every game
+        add_home_team(home_team)
+        add_away_team(away_team)
+        add_start_time(start_time)
+        add_spread(spread)
+        add_home_spread_price(home_spread_price)
+        add_away_spread_price(away_spread_price)
+        add_home_moneyline(home_moneyline)
+        add_away_moneyline(away_moneyline)
+        add_scrape_time(scrape_time)
     return lines
 
 
@@ -110,17 +161,13 @@ def parse_teams(competitors):
     """Parse a competitors object from Bovada and return the home and away teams, respectively"""
     if len(competitors) > 2:
         raise Exception("Unexpected objects in competitors")
-    home_team = ""
-    away_team = ""
-    for team in competitors:
-        if team["home"]:
-            home_team = team["name"]
-        else:
-            away_team = team["name"]
-    if not home_team == "" or away_team == "":
-        return home_team.upper(), away_team.upper()
-    else:
+    # The home flag keys each competitor straight to its slot; no per-team branching
+    teams = {team["home"]: team["name"] for team in competitors}
+    home_team = teams.get(True, "")
+    away_team = teams.get(False, "")
+    if home_team == "" or away_team == "":
         raise Exception("Competitors was not properly parsed. Missing data.")
+    return home_team.upper(), away_team.upper()
 
 
 def parse_moneyline(moneyline_bet):
@@ -166,32 +213,6 @@ def parse_spread(spread_bet):
         raise Exception("Spread was not properly parsed. Missing data.")
 
 
-def create_odds_table(database, data, tbl_name, sched_tbl):
-    """Creates an odds_table in the database based on the data with foreign key based on the schedule
-
-    Args:
-        database: An instance of the DBInterface class from database/DBInterface.py
-        data: A DataOperator object from database/manipulator which holds the data and
-        tbl_name:
-        sched_tbl: The schedule table which will contain the game_id for the odds_table and which will be given a
-        relationship to the odds table
-    """
-    # Set columns and constraints
-    sql_types = data.get_sql_type()
-    sched_tbl_name = sched_tbl.classes.items()[0][0]
-    sql_types.update({'game_id': [Integer, ForeignKey(sched_tbl_name + ".id")]})
-    constraint = {UniqueConstraint: ["home_team", "away_team", "start_time"]}
-
-    database.map_table(tbl_name, sql_types, constraint)  # Maps the odds table
-
-    # Establish relationship if it does not exist
-    if "odds" not in sched_tbl.__mapper__.relationships.keys():
-        sched_tbl.odds = relationship(database.Template)
-
-    database.create_tables()
-    database.clear_mappers()
-
-
 def update_odds_table(odds_table, sched_tbl, rows, session):
     """Update the odds_table with the information in rows
 
@@ -201,76 +222,48 @@ def update_odds_table(odds_table, sched_tbl, rows, session):
         rows: A dictionary of rows with column names as keys with lists of values
         session: A SQLalchemy session object
     """
-    row_objects = []
     if len(rows) == 0:  # Avoid messing with things if no rows exist
         print("No new odds available. Returning without updating odds table")
         return
     for row in rows:
-        # Delete the row in the table if it exists to allow overwrite
-        existing_rows = session.query(odds_table).filter(odds_table.home_team == row["home_team"],
-                                                         odds_table.away_team == row["away_team"],
-                                                         odds_table.start_time == row["start_time"])
-        if len(existing_rows.all()) > 0:
-            for exist_row in existing_rows.all():
-                session.delete(exist_row)
-
-        # Adds all of the normal betting data
-        row_object = odds_table(**row)
-
-        # Finds and adds the foreign key from the schedule
-        game = session.query(sched_tbl).filter(sched_tbl.home_team == row_object.home_team,
-                                               sched_tbl.away_team == row_object.away_team,
-                                               sched_tbl.start_time == row_object.start_time).all()
-        if len(game) > 1:
+        # Delete the row in the table if it exists to allow overwrite. A bulk delete() emits one DELETE
+        # without loading the rows; the old code materialized the query twice (len(.all()) and again to
+        # iterate) and deleted the loaded objects one at a time
+        session.query(odds_table).filter(odds_table.home_team == row["home_team"],
+                                         odds_table.away_team == row["away_team"],
+                                         odds_table.start_time == row["start_time"]).\
+            delete(synchronize_session=False)
+
+    # Find and add the foreign key from the schedule; a single query resolves every row's game rather
+    # than one query per row
+    games = session.query(sched_tbl.home_team, sched_tbl.away_team, sched_tbl.start_time, sched_tbl.id). \
+        filter(sched_tbl.home_team.in_([row["home_team"] for row in rows]),
+               sched_tbl.start_time.in_([row["start_time"] for row in rows])).all()
+    game_ids = {}
+    for game in games:
+        key = (game.home_team, game.away_team, game.start_time)
+        if key in game_ids:
             raise Exception("More than one game matches the row")
-        game = game[0]
-        row_object.game_id = game.id
-
-        row_objects.append(row_object)
-    try:
-        session.add_all(row_objects)
-    except IntegrityError:  # If all objects cannot be added, try to add each one individually
-        for row in row_objects:
-            try:
-                session.add(row)
-            except IntegrityError:
-                continue
+        game_ids[key] = game.id
+    for row in rows:
+        row["game_id"] = game_ids[(row["home_team"], row["away_team"], row["start_time"])]
+
+    # Core executemany; one INSERT for every row rather than an ORM object per row. The unique
+    # constraint cannot trip here because conflicting rows were deleted above.
+    session.execute(insert(odds_table), rows)
 
 
 def scrape():
-    """Scrapes betting line information from bovada and adds it to the session"""
-    league_year = Config.get_property("league_year")
+    """Scrapes betting line information from bovada and returns it, or False when no lines are available"""
     lines = odds_for_today()
     if not lines:
         return False
     return lines
 
-    line_data = DataOperator(lines)
-
-    tbl_name = "odds_{}".format(league_year)
-    tbl_exists = database.table_exists(tbl_name)
-    if not tbl_exists:
-        create_odds_table(database, line_data, tbl_name, schedule)
-        tbl_exists = database.table_exists(tbl_name)
-
-    if line_data.validate_data_length() and tbl_exists:
-        # All values in line_data are expected to be be unique from values in the database. A possible place for errors
-        # to occur
-        odds_table = database.get_table_mappings([tbl_name])
-
-        # Reconcile ensures the odds_table has appropriate start_times; Add logic so its not called every run
-        reconcile(schedule, odds_table, "start_time", "id", "game_id", session)
-
-        update_odds_table(odds_table, schedule, line_data.dict_to_rows(), session)
-    else:
-        raise Exception("Something is wrong here (Not descriptive, but this point shouldn't be hit.)")
-
-    return True
-
 
 if __name__ == "__main__":
     from datatotable.database import Database
     db = Database("test", Config.get_property("outputs"))
     year = 2019
     session = Session(bind=db.engine)
-    scrape(db, session)
+    scrape()